@@ -5,11 +5,13 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -21,12 +23,28 @@ db = None
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+
+def connect():
+    """Create the Motor client. Call from the app lifespan so it binds to the running loop"""
+    global _client, db
+    if _client is None and database_url and database_name:
+        # minPoolSize keeps warm connections so the first requests don't pay for the handshake
+        _client = AsyncIOMotorClient(database_url, maxPoolSize=max_pool_size, minPoolSize=min_pool_size)
+        db = _client[database_name]
+    return db
+
+def close():
+    """Close the Motor client, if one was created"""
+    global _client, db
+    if _client is not None:
+        _client.close()
+    _client = None
+    db = None
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -40,16 +58,88 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def create_documents(collection_name: str, items: List[Union[BaseModel, dict]]):
+    """Insert several documents with timestamps in one round-trip.
+    Returns (inserted ids, errors) where errors hold the index and message of each failed item."""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for data in items:
+        data_dict = data.model_dump() if isinstance(data, BaseModel) else data.copy()
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        data_dict['_id'] = ObjectId()
+        docs.append(data_dict)
+
+    # unordered so one bad document doesn't abort the rest of the batch
+    try:
+        await db[collection_name].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        failed = {err["index"] for err in write_errors}
+        ids = [str(d['_id']) for i, d in enumerate(docs) if i not in failed]
+        errors = [{"index": err["index"], "message": err.get("errmsg")} for err in write_errors]
+        return ids, errors
+    return [str(d['_id']) for d in docs], []
+
+def _documents_pipeline(filter_dict: dict = None, limit: int = None, projection: dict = None):
+    pipeline = [{"$match": filter_dict or {}}]
     if limit:
-        cursor = cursor.limit(limit)
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": {**projection, "id": {"$toString": "$_id"}, "_id": 0}})
+    else:
+        pipeline.append({"$addFields": {"id": {"$toString": "$_id"}}})
+        pipeline.append({"$project": {"_id": 0}})
+    return pipeline
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally returning only the projected fields.
+    The ObjectId is returned as a string "id" field instead of "_id"."""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    return list(cursor)
+    cursor = db[collection_name].aggregate(_documents_pipeline(filter_dict, limit, projection))
+    return await cursor.to_list(length=None)
+
+def stream_documents(collection_name: str, filter_dict: dict = None, projection: dict = None, batch_size: int = 500):
+    """Like get_documents, but return the cursor to iterate with `async for` batch by batch"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return db[collection_name].aggregate(_documents_pipeline(filter_dict, projection=projection), batchSize=batch_size)
+
+async def get_document(collection_name: str, filter_dict: dict, projection: dict = None):
+    """Get a single document from collection, or None"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return await db[collection_name].find_one(filter_dict, projection)
+
+async def aggregate_documents(collection_name: str, pipeline: list):
+    """Run an aggregation pipeline against a collection"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = db[collection_name].aggregate(pipeline)
+    return await cursor.to_list(length=None)
+
+async def ensure_indexes():
+    """Create the indexes the API queries rely on (no-op if they already exist)"""
+    if db is None:
+        return
+
+    # days and times are both arrays, and a compound index can't span two array
+    # fields (inserts fail with "cannot index parallel arrays"); drop the old one
+    if "active_1_days_1_times_1" in await db["medication"].index_information():
+        await db["medication"].drop_index("active_1_days_1_times_1")
+    # Narrows the schedule $match; the query is never covered (days is multikey
+    # and name/dosage/times are read from the document).
+    await db["medication"].create_index([("active", 1), ("days", 1)])
+    await db["intake"].create_index([("medication_id", 1), ("date", 1)])
+    await db["caregiverlink"].create_index("token", unique=True)
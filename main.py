@@ -1,15 +1,56 @@
 import os
+import time
 import uuid
-from datetime import datetime, date as dt_date
+import orjson
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone, date as dt_date
+from bson import ObjectId
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
-from database import db, create_document, get_documents
+import database
+from database import (
+    create_document, create_documents, get_document, get_documents, stream_documents, aggregate_documents,
+)
 from schemas import Medication, Intake, CaregiverLink
 
-app = FastAPI(title="Pill Reminder API")
+def _dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=str, option=orjson.OPT_NAIVE_UTC)
+
+class APIResponse(ORJSONResponse):
+    """orjson response for Mongo documents (ObjectId via str, naive datetimes as UTC).
+    Return it directly from a route: FastAPI runs jsonable_encoder over plain return values."""
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
+
+async def _json_array(first: Dict[str, Any], cursor):
+    # encode documents as they arrive so memory stays bounded by the cursor batch
+    yield b"[" + _dumps(first)
+    async for d in cursor:
+        yield b"," + _dumps(d)
+    yield b"]"
+
+async def _stream_json(cursor) -> Response:
+    # The query only runs once the cursor is advanced; fetch the first document
+    # here so query errors still surface before the 200 and body are sent.
+    try:
+        first = await cursor.next()
+    except StopAsyncIteration:
+        return Response(content=b"[]", media_type="application/json")
+    return StreamingResponse(_json_array(first, cursor), media_type="application/json")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the Motor client inside the running loop, once per worker
+    database.connect()
+    await database.ensure_indexes()
+    yield
+    database.close()
+
+app = FastAPI(title="Pill Reminder API", lifespan=lifespan, default_response_class=APIResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,30 +60,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Constant bodies for health checks, encoded once
+_ROOT_RESPONSE = Response(content=b'{"message":"Pill Reminder Backend Running"}', media_type="application/json")
+_LIVE_RESPONSE = Response(content=b'{"status":"ok"}', media_type="application/json")
+
 @app.get("/")
 def read_root():
-    return {"message": "Pill Reminder Backend Running"}
+    return _ROOT_RESPONSE
+
+@app.get("/livez")
+def liveness():
+    # never touches Mongo
+    return _LIVE_RESPONSE
+
+READY_CACHE_TTL = 5  # seconds
+_ready_at = 0.0
+
+@app.get("/readyz")
+async def readiness():
+    global _ready_at
+    db = database.db
+    if _ready_at and time.monotonic() - _ready_at < READY_CACHE_TTL:
+        return _LIVE_RESPONSE
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    try:
+        await db.command("ping")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e)[:50])
+    _ready_at = time.monotonic()
+    return _LIVE_RESPONSE
+
+# Environment doesn't change while the process runs, so resolve it once
+_DATABASE_URL_STATUS = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
+_DATABASE_NAME_STATUS = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+
+# /test is often used as a probe; don't run listCollections on every hit
+COLLECTIONS_CACHE_TTL = 30  # seconds
+_collections_cache: Tuple[float, List[str]] = (0.0, [])
 
 @app.get("/test")
-def test_database():
+async def test_database():
+    global _collections_cache
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
-        "database_url": None,
-        "database_name": None,
+        "database_url": _DATABASE_URL_STATUS,
+        "database_name": _DATABASE_NAME_STATUS,
         "connection_status": "Not Connected",
         "collections": []
     }
 
+    db = database.db
     try:
         if db is not None:
             response["database"] = "✅ Available"
-            response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
-                response["collections"] = collections[:10]
+                stored_at, collections = _collections_cache
+                if not stored_at or time.monotonic() - stored_at >= COLLECTIONS_CACHE_TTL:
+                    collections = (await db.list_collection_names())[:10]
+                    _collections_cache = (time.monotonic(), collections)
+                response["collections"] = collections
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
                 response["database"] = f"⚠️  Connected but Error: {str(e)[:50]}"
@@ -51,8 +130,6 @@ def test_database():
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:50]}"
 
-    response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
     return response
 
 # Helper models
@@ -70,38 +147,84 @@ class IntakeOut(Intake):
 
 class ShareCreate(BaseModel):
     medication_ids: Optional[List[str]] = None
-    expires_at: Optional[str] = None  # ISO timestamp
+    expires_at: Optional[datetime] = None  # ISO timestamp
+
+# Only fetch the schema fields (plus _id) for list endpoints
+MEDICATION_PROJECTION = {field: 1 for field in Medication.model_fields}
+INTAKE_PROJECTION = {field: 1 for field in Intake.model_fields}
+
+# In-process schedule cache: date -> (stored_at, schedule). Medications change
+# rarely while the same day is polled repeatedly, so serve it from memory.
+# Invalidation only reaches the worker that handled the write, so with several
+# workers the others may serve a stale schedule for up to the TTL. The Procfile
+# runs multiple workers unless WEB_CONCURRENCY says otherwise, so the longer TTL
+# is only used when WEB_CONCURRENCY=1 is set explicitly (override with SCHEDULE_CACHE_TTL).
+SCHEDULE_CACHE_TTL = int(os.getenv(
+    "SCHEDULE_CACHE_TTL", "60" if os.getenv("WEB_CONCURRENCY") == "1" else "10"
+))  # seconds
+SCHEDULE_CACHE_MAX = 1_000
+_schedule_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+def _invalidate_schedule_cache():
+    _schedule_cache.clear()
+
+def _store_schedule(key: str, sched: Dict[str, Any]):
+    now = time.monotonic()
+    if len(_schedule_cache) >= SCHEDULE_CACHE_MAX:
+        for k in [k for k, (stored_at, _) in _schedule_cache.items() if now - stored_at >= SCHEDULE_CACHE_TTL]:
+            del _schedule_cache[k]
+        if len(_schedule_cache) >= SCHEDULE_CACHE_MAX:
+            _schedule_cache.clear()
+    _schedule_cache[key] = (now, sched)
+
+# Validated share links: token -> (stored_at, link). Every share view hits this.
+SHARE_LINK_CACHE_TTL = 300  # seconds
+SHARE_LINK_CACHE_MAX = 10_000
+_share_link_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 
 # Core Routes
 @app.post("/api/medications", response_model=dict)
 async def create_medication(payload: MedicationCreate):
     try:
-        med_id = create_document("medication", payload)
+        med_id = await create_document("medication", payload)
+        _invalidate_schedule_cache()
         return {"id": med_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/medications", response_model=List[MedicationOut])
+# List endpoints return our own trusted documents as a response object, so FastAPI
+# neither validates nor jsonable_encodes every item; the shape is documented via `responses`.
+@app.get("/api/medications", response_model=None, responses={200: {"model": List[MedicationOut]}})
 async def list_medications():
     try:
-        docs = get_documents("medication")
-        result: List[MedicationOut] = []
-        for d in docs:
-            d["id"] = str(d.pop("_id"))
-            result.append(MedicationOut(**d))
-        return result
+        return APIResponse(await get_documents("medication", projection=MEDICATION_PROJECTION))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/intakes", response_model=dict)
 async def log_intake(payload: IntakeCreate):
     try:
-        intake_id = create_document("intake", payload)
+        intake_id = await create_document("intake", payload)
         return {"id": intake_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/intakes", response_model=List[IntakeOut])
+MAX_BULK_INTAKES = 500
+
+@app.post("/api/intakes/bulk", response_model=dict)
+async def log_intakes_bulk(payload: List[IntakeCreate]):
+    if len(payload) > MAX_BULK_INTAKES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_INTAKES} intakes per request")
+    if not payload:
+        return {"ids": [], "errors": []}
+    try:
+        intake_ids, errors = await create_documents("intake", payload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    # partial success: report what was stored so clients only retry the failed indexes
+    return APIResponse({"ids": intake_ids, "errors": errors}, status_code=207 if errors else 200)
+
+@app.get("/api/intakes", response_model=None, responses={200: {"model": List[IntakeOut]}})
 async def list_intakes(medication_id: Optional[str] = None, date: Optional[str] = None):
     try:
         filt: Dict[str, Any] = {}
@@ -109,88 +232,146 @@ async def list_intakes(medication_id: Optional[str] = None, date: Optional[str]
             filt["medication_id"] = medication_id
         if date:
             filt["date"] = date
-        docs = get_documents("intake", filt)
-        result: List[IntakeOut] = []
-        for d in docs:
-            d["id"] = str(d.pop("_id"))
-            result.append(IntakeOut(**d))
-        return result
+        return await _stream_json(stream_documents("intake", filt, projection=INTAKE_PROJECTION))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _to_object_ids(ids: Optional[List[str]]) -> List[ObjectId]:
+    return [ObjectId(x) for x in (ids or []) if ObjectId.is_valid(x)]
+
+def _schedule_pipeline(weekday: int, allowed_oids: Optional[List[ObjectId]] = None) -> List[Dict[str, Any]]:
+    """Filter, expand times and sort in Mongo; docs without "days" apply every day.
+    When `allowed_oids` is given only those medications are matched."""
+    match: Dict[str, Any] = {"active": True, "$or": [{"days": weekday}, {"days": {"$exists": False}}]}
+    if allowed_oids is not None:
+        match["_id"] = {"$in": allowed_oids}
+    return [
+        {"$match": match},
+        {"$unwind": "$times"},
+        {"$project": {
+            "_id": 0,
+            "medication_id": {"$toString": "$_id"},
+            "name": 1,
+            "dosage": 1,
+            "time": "$times",
+        }},
+        # medication_id (ObjectId hex) breaks ties in creation order, like the old stable sort
+        {"$sort": {"time": 1, "medication_id": 1}},
+    ]
+
+# (weekday, iso date, valid until epoch seconds) for the current local day
+_today_cache: Tuple[int, str, float] = (0, "", 0.0)
+
+def _today() -> Tuple[int, str]:
+    global _today_cache
+    if time.time() < _today_cache[2]:
+        return _today_cache[0], _today_cache[1]
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    _today_cache = (now.weekday(), now.date().isoformat(), midnight.timestamp())
+    return _today_cache[0], _today_cache[1]
+
+def _resolve_day(date: Optional[str]) -> Tuple[int, str]:
+    """(weekday 0=Mon..6=Sun, iso date) for the requested date, defaulting to today"""
+    if not date:
+        return _today()
+    target = datetime.fromisoformat(date)
+    return target.weekday(), target.date().isoformat()
+
 # Schedule endpoint for a given date
 @app.get("/api/schedule")
 async def get_schedule(date: Optional[str] = None):
     try:
-        if date:
-            target = datetime.fromisoformat(date)
-        else:
-            target = datetime.now()
-        weekday = (target.weekday())  # 0=Mon..6=Sun
-        meds = get_documents("medication", {"active": True})
-        items = []
-        for m in meds:
-            # Ensure structure
-            m_days = m.get("days", [0,1,2,3,4,5,6])
-            if weekday in m_days:
-                for t in m.get("times", []):
-                    items.append({
-                        "medication_id": str(m.get("_id")),
-                        "name": m.get("name"),
-                        "dosage": m.get("dosage"),
-                        "time": t
-                    })
-        items.sort(key=lambda x: x["time"])
-        return {"date": target.date().isoformat(), "weekday": weekday, "items": items}
+        weekday, key = _resolve_day(date)
+        cached = _schedule_cache.get(key)
+        if cached and time.monotonic() - cached[0] < SCHEDULE_CACHE_TTL:
+            return APIResponse(cached[1])
+        items = await aggregate_documents("medication", _schedule_pipeline(weekday))
+        sched = {"date": key, "weekday": weekday, "items": items}
+        _store_schedule(key, sched)
+        return APIResponse(sched)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _naive_utc(value: datetime) -> datetime:
+    # stored as naive UTC, like the driver returns it
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 # Caregiver share endpoints
 @app.post("/api/share/create")
 async def create_share_link(payload: ShareCreate):
     try:
         token = uuid.uuid4().hex[:12]
+        expires_at = _naive_utc(payload.expires_at) if payload.expires_at else None
         doc = {
             "token": token,
             "read_only": True,
-            "expires_at": payload.expires_at,
+            "expires_at": expires_at,
             "medication_ids": payload.medication_ids,
+            # parsed once here so share views can use them in $in directly
+            "medication_oids": _to_object_ids(payload.medication_ids),
         }
-        _id = create_document("caregiverlink", doc)
+        _id = await create_document("caregiverlink", doc)
         base = os.getenv("FRONTEND_URL") or os.getenv("PUBLIC_FRONTEND_URL") or ""
         return {"token": token, "url": f"{base}/?share={token}" if base else token}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _validate_share_token(token: str) -> Dict[str, Any]:
-    links = get_documents("caregiverlink", {"token": token})
-    if not links:
-        raise HTTPException(status_code=404, detail="Share link not found")
-    link = links[0]
-    # optional expiration check
-    expires_at = link.get("expires_at")
-    if expires_at:
-        try:
-            if datetime.fromisoformat(expires_at) < datetime.utcnow():
+async def _validate_share_token(token: str) -> Dict[str, Any]:
+    cached = _share_link_cache.get(token)
+    if cached and time.monotonic() - cached[0] < SHARE_LINK_CACHE_TTL:
+        link = cached[1]
+    else:
+        projection = {"_id": 0, "medication_ids": 1, "medication_oids": 1, "expires_at": 1}
+        link = await get_document(
+            "caregiverlink",
+            {"token": token, "$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.utcnow()}}]},
+            projection,
+        )
+        if link is None:
+            link = await get_document("caregiverlink", {"token": token}, projection)
+            if link is None:
+                raise HTTPException(status_code=404, detail="Share link not found")
+            expires_at = link.get("expires_at")
+            if not isinstance(expires_at, str):
                 raise HTTPException(status_code=410, detail="Share link expired")
-        except ValueError:
-            pass
+            # links created before expires_at was stored as a date; unparsable values never expired
+            try:
+                link["expires_at"] = _naive_utc(datetime.fromisoformat(expires_at))
+            except ValueError:
+                link["expires_at"] = None
+        if "medication_oids" not in link:
+            # links created before medication_oids was stored
+            link["medication_oids"] = _to_object_ids(link.get("medication_ids"))
+        if len(_share_link_cache) >= SHARE_LINK_CACHE_MAX:
+            _share_link_cache.clear()
+        _share_link_cache[token] = (time.monotonic(), link)
+    # a cached link may have expired since it was fetched
+    expires_at = link.get("expires_at")
+    if expires_at is not None and expires_at <= datetime.utcnow():
+        _share_link_cache.pop(token, None)
+        raise HTTPException(status_code=410, detail="Share link expired")
     return link
 
 @app.get("/api/share/{token}/schedule")
 async def shared_schedule(token: str, date: Optional[str] = None):
-    link = _validate_share_token(token)
-    allowed = set(link.get("medication_ids") or [])
-    # reuse schedule logic
-    sched = await get_schedule(date)
-    if allowed:
-        sched["items"] = [i for i in sched["items"] if i["medication_id"] in allowed]
-    return sched
+    link = await _validate_share_token(token)
+    if not link.get("medication_ids"):
+        # unrestricted link: reuse schedule logic (and its cache)
+        return await get_schedule(date)
+    try:
+        weekday, day = _resolve_day(date)
+        items = await aggregate_documents("medication", _schedule_pipeline(weekday, link["medication_oids"]))
+        return APIResponse({"date": day, "weekday": weekday, "items": items})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/share/{token}/intakes")
 async def shared_intakes(token: str, medication_id: Optional[str] = None, date: Optional[str] = None):
-    link = _validate_share_token(token)
+    link = await _validate_share_token(token)
     allowed = set(link.get("medication_ids") or [])
     if allowed and medication_id and medication_id not in allowed:
         raise HTTPException(status_code=403, detail="Not permitted for this medication")
@@ -199,18 +380,22 @@ async def shared_intakes(token: str, medication_id: Optional[str] = None, date:
         filt["date"] = date
     if medication_id:
         filt["medication_id"] = medication_id
-    docs = get_documents("intake", filt)
-    # If allowed set exists, filter results
-    if allowed:
-        docs = [d for d in docs if d.get("medication_id") in allowed]
-    # format
-    out = []
-    for d in docs:
-        d["id"] = str(d.pop("_id"))
-        out.append(d)
-    return out
+    elif allowed:
+        # restrict to the shared medications in the query itself
+        filt["medication_id"] = {"$in": list(allowed)}
+    try:
+        return await _stream_json(stream_documents("intake", filt, projection=INTAKE_PROJECTION))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
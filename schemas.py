@@ -6,6 +6,7 @@ lowercase class name (e.g., Medication -> "medication").
 """
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from datetime import datetime
 
 class Medication(BaseModel):
     """Medications prescribed to a person.
@@ -33,5 +34,5 @@ class CaregiverLink(BaseModel):
     """
     token: str = Field(..., description="Unique share token")
     read_only: bool = Field(True, description="Whether the link is read-only")
-    expires_at: Optional[str] = Field(None, description="Optional ISO timestamp for expiration")
+    expires_at: Optional[datetime] = Field(None, description="Optional expiration time (stored as UTC)")
     medication_ids: Optional[List[str]] = Field(None, description="Optional subset of medication IDs to share")
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import BulkWriteError
+
+import database
+import main
+
+
+INTAKE = {"medication_id": "m1", "time": "08:00", "date": "2024-01-01"}
+
+
+class _Collection:
+    def __init__(self, failed_indexes):
+        self.failed_indexes = failed_indexes
+
+    async def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        if self.failed_indexes:
+            raise BulkWriteError({
+                "writeErrors": [{"index": i, "code": 11000, "errmsg": "duplicate key"} for i in self.failed_indexes],
+            })
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def install(failed_indexes=()):
+        monkeypatch.setattr(database, "db", {"intake": _Collection(list(failed_indexes))})
+    return install
+
+
+def test_create_documents_returns_all_ids(fake_db):
+    fake_db()
+    ids, errors = asyncio.run(database.create_documents("intake", [INTAKE, INTAKE]))
+    assert len(ids) == 2 and len(set(ids)) == 2
+    assert errors == []
+
+
+def test_create_documents_reports_partial_failure(fake_db):
+    fake_db(failed_indexes=[1])
+    ids, errors = asyncio.run(database.create_documents("intake", [INTAKE, INTAKE, INTAKE]))
+    assert len(ids) == 2
+    assert errors == [{"index": 1, "message": "duplicate key"}]
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_bulk_endpoint_partial_failure_is_207(fake_db, client):
+    fake_db(failed_indexes=[0])
+    res = client.post("/api/intakes/bulk", json=[INTAKE, INTAKE])
+    assert res.status_code == 207
+    body = res.json()
+    assert len(body["ids"]) == 1
+    assert body["errors"] == [{"index": 0, "message": "duplicate key"}]
+
+
+def test_bulk_endpoint_success_is_200(fake_db, client):
+    fake_db()
+    res = client.post("/api/intakes/bulk", json=[INTAKE, INTAKE])
+    assert res.status_code == 200
+    assert len(res.json()["ids"]) == 2
+    assert res.json()["errors"] == []
+
+
+def test_bulk_endpoint_rejects_oversized_batch(fake_db, client):
+    fake_db()
+    res = client.post("/api/intakes/bulk", json=[INTAKE] * (main.MAX_BULK_INTAKES + 1))
+    assert res.status_code == 413
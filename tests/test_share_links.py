@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def _matches(doc, filt):
+    """Just enough of Mongo's matching for _validate_share_token's queries"""
+    if doc["token"] != filt["token"]:
+        return False
+    if "$or" in filt:
+        # a date $gt never matches a string, like BSON type bracketing
+        expires_at = doc.get("expires_at")
+        now = filt["$or"][1]["expires_at"]["$gt"]
+        return expires_at is None or (isinstance(expires_at, datetime) and expires_at > now)
+    return True
+
+
+@pytest.fixture
+def links(monkeypatch):
+    docs = []
+
+    async def get_document(collection_name, filter_dict, projection=None):
+        assert collection_name == "caregiverlink"
+        for doc in docs:
+            if _matches(doc, filter_dict):
+                return {k: v for k, v in doc.items() if k != "token"}
+        return None
+
+    async def aggregate_documents(collection_name, pipeline):
+        return []
+
+    monkeypatch.setattr(main, "get_document", get_document)
+    monkeypatch.setattr(main, "aggregate_documents", aggregate_documents)
+    main._share_link_cache.clear()
+    main._schedule_cache.clear()
+    return docs
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _add(links, expires_at):
+    links.append({"token": "t", "medication_ids": None, "expires_at": expires_at})
+
+
+def test_unknown_token_is_404(links, client):
+    assert client.get("/api/share/missing/schedule").status_code == 404
+
+
+def test_no_expiry(links, client):
+    _add(links, None)
+    assert client.get("/api/share/t/schedule").status_code == 200
+
+
+def test_future_expiry(links, client):
+    _add(links, datetime.utcnow() + timedelta(days=1))
+    assert client.get("/api/share/t/schedule").status_code == 200
+
+
+def test_past_expiry_is_410(links, client):
+    _add(links, datetime.utcnow() - timedelta(days=1))
+    assert client.get("/api/share/t/schedule").status_code == 410
+
+
+@pytest.mark.parametrize("expires_at, status", [
+    ("2099-01-01T00:00:00", 200),
+    ("2000-01-01T00:00:00", 410),
+    ("2099-01-01T00:00:00+02:00", 200),
+    ("2000-01-01T00:00:00+02:00", 410),
+    ("not a date", 200),
+])
+def test_legacy_string_expiry(links, client, expires_at, status):
+    _add(links, expires_at)
+    assert client.get("/api/share/t/schedule").status_code == status
+
+
+def test_legacy_expiry_is_cached_as_datetime(links, client):
+    _add(links, "2099-01-01T00:00:00+02:00")
+    client.get("/api/share/t/schedule")
+    assert main._share_link_cache["t"][1]["expires_at"] == datetime(2098, 12, 31, 22, 0)
+
+
+def test_cached_link_expiring_is_410_and_evicted(links, client):
+    _add(links, datetime.utcnow() + timedelta(days=1))
+    assert client.get("/api/share/t/schedule").status_code == 200
+    main._share_link_cache["t"][1]["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+    assert client.get("/api/share/t/schedule").status_code == 410
+    assert "t" not in main._share_link_cache